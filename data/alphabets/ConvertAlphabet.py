@@ -1,101 +1,109 @@
-import xml.etree.ElementTree as ET
-import glob
+from lxml import etree as ET
+from concurrent.futures import ProcessPoolExecutor
+import os
+import re
 
-AlphabetUsesCharColors = False
-AlphabetUsesGroupColors = False
+# the old colour indices are only kept as comments when DASHER_DEBUG_XML=1
+EMIT_DEBUG_COMMENTS = os.environ.get("DASHER_DEBUG_XML") == "1"
 
-def cleanString(s) : return "".join(x for x in s if x.isascii() and x.isalnum() or x == ".")
+ALPHABET_HEADER = b'<?xml version="1.0" encoding="UTF-8"?>\n<!DOCTYPE alphabet SYSTEM "../alphabet.dtd">\n'
 
-def AddCharData(Parent, data) :
-    global AlphabetUsesCharColors
-    newChar = ET.SubElement(Parent, "node", {
+_CLEAN_RE = re.compile(r'[^A-Za-z0-9.]')
+_CONV_MODE_LUT = ("none", "none", "mandarin", "routingContextInsensitve", "routingContextSensitive")
+
+def cleanString(s) : return _CLEAN_RE.sub('', s)
+
+def conversionMode2str(convMode) : return _CONV_MODE_LUT[int(convMode)]
+
+# state is [usesCharColors, usesGroupColors] for the alphabet being converted
+def AddCharData(data, state) :
+    newChar = ET.Element("node", {
         "label" : data[0]
     })
     if not data[2] == -1 :
-        newChar.append(ET.Comment(f"Old Char Color: {str(data[2])}"))
-        AlphabetUsesCharColors = True
+        if EMIT_DEBUG_COMMENTS : newChar.append(ET.Comment(f"Old Char Color: {data[2]}"))
+        state[0] = True
     if not data[3] == "" :
         newChar.append(ET.Comment(f"Note: {data[3]}"))
     inputAction = ET.SubElement(newChar, "textCharAction")
     if not data[1] == None and not data[0] == data[1] :
         inputAction.attrib["unicode"] = str(ord(data[1]))
+    return newChar
 
-for filename in glob.glob('./oldAlphabets/alphabet.*.xml'):
-    AlphabetUsesCharColors = False
-    AlphabetUsesGroupColors = False
-    parser = ET.XMLParser(target=ET.TreeBuilder(insert_comments=True))
-    input = ET.parse(filename, parser=parser).getroot()
-
-    def getAttrib(Element, attrib, alt=None) :
-        if(Element == None) : return alt
-        return Element.attrib[attrib] if attrib in Element.attrib else alt
+# returns (newFilename, blob) for every alphabet in the file; the caller does the writing
+def convertFile(filename):
+    converted = []
 
     def getCharData(tag):
         if(tag == None) : return None
-        return [
-            getAttrib(tag, 'd', None),
-            getAttrib(tag, 't', None),
-            getAttrib(tag, 'b', -1),
-            getAttrib(tag, 'note', "")
-        ]
+        return (
+            tag.get('d'),
+            tag.get('t'),
+            tag.get('b', -1),
+            tag.get('note', "")
+        )
 
-        
-    def conversionMode2str(convMode) :
-        LUT = ["none", "none", "mandarin", "routingContextInsensitve", "routingContextSensitive"]
-        return LUT[int(convMode)]
-
-    def parseRecursive(element, outputElement, explicitInvisible) -> bool :
-        global AlphabetUsesCharColors
-        global AlphabetUsesGroupColors
+    # converted nodes are collected in outputNodes and attached by the caller in one extend()
+    def parseRecursive(element, outputNodes, explicitInvisible, state) -> bool :
         if element.tag == "group" :
             #if this group only has 1 group as child, just skip this one in parsing
-            children = element.findall("*")
-            visible = getAttrib(element, "visible", "yes")
+            children = list(element)
+            visible = element.get("visible", "yes")
             if explicitInvisible : visible = "no"
-            name = getAttrib(element, "name")
-            label = getAttrib(element, "label")
-            if(len(children) == 1 and (children[0].tag == group or children[0].tag == "s") and visible == "no" and name == None and label == None):
-                return parseRecursive(children[0], outputElement, False)
+            name = element.get("name")
+            label = element.get("label")
+            if(len(children) == 1 and (children[0].tag == "group" or children[0].tag == "s") and visible == "no" and name == None and label == None):
+                return parseRecursive(children[0], outputNodes, False, state)
                 
-            color = getAttrib(element, "b")
-            newGroup = ET.SubElement(outputElement, "group")
+            color = element.get("b")
+            newGroup = ET.Element("group")
+            outputNodes.append(newGroup)
             if name != None : 
                 newGroup.attrib["name"] = name
             if label != None and label != "" : 
                 newGroup.attrib["label"] = label
             if visible != "no" and color != None :
                 if(name != None) : newGroup.attrib["colorInfoName"] = name.lower()
-                newGroup.append(ET.Comment(f"Old Group Color: {color}"))
-                AlphabetUsesGroupColors = True                
+                if EMIT_DEBUG_COMMENTS : newGroup.append(ET.Comment(f"Old Group Color: {color}"))
+                state[1] = True
             
             ChildUsesColors = False
+            childNodes = []
             for child in children:
-                ChildUsesColors = parseRecursive(child, newGroup, False) or ChildUsesColors
+                # always recurse first; the call must not be short-circuited away
+                if parseRecursive(child, childNodes, False, state) : ChildUsesColors = True
+            newGroup.extend(childNodes)
             if ChildUsesColors and name != None : newGroup.attrib["colorInfoName"] = name.lower()
                 
         if element.tag == "s" :
             data = getCharData(element)
-            AddCharData(outputElement, data)
+            outputNodes.append(AddCharData(data, state))
             if(data[2] != -1) : return True
             
-        if "function Comment" in str(element.tag):
-            outputElement.append(element)
+        if element.tag is ET.Comment :
+            outputNodes.append(element)
             
         return False
                 
 
-    for alphabet in input.iter('alphabet') :
-        AlphabetUsesCharColors = False
-        AlphabetUsesGroupColors = False
-        name = getAttrib(alphabet, "name")
-        orientation = getAttrib(alphabet.find("orientation"), "type")
-        conversionMode = alphabet.find("conversionmode")
-        conversionMode = getAttrib(conversionMode, "id")
-        trainingfile = alphabet.find("train").text
-        colorsName = alphabet.find("palette")
-        colorsName = colorsName.text if colorsName != None else "Default"
-        paragraph = getCharData(alphabet.find("paragraph"))
-        space = getCharData(alphabet.find("space"))
+    for _, alphabet in ET.iterparse(filename, events=("end",), tag="alphabet", remove_blank_text=True, strip_cdata=False) :
+        state = [False, False]
+        name = alphabet.get("name")
+        orientation = conversionMode = trainingfile = paragraph = space = None
+        colorsName = "Default"
+        comments = []
+        groups = []
+        # collect everything we need from the alphabet's children in a single pass
+        for child in alphabet :
+            tag = child.tag
+            if tag == "group" : groups.append(child)
+            elif tag is ET.Comment : comments.append(child)
+            elif tag == "orientation" : orientation = child.get("type")
+            elif tag == "conversionmode" : conversionMode = child.get("id")
+            elif tag == "train" : trainingfile = child.text
+            elif tag == "palette" : colorsName = child.text
+            elif tag == "paragraph" : paragraph = getCharData(child)
+            elif tag == "space" : space = getCharData(child)
                
         output = ET.Element("alphabet",{
             "name": name,
@@ -106,41 +114,54 @@ for filename in glob.glob('./oldAlphabets/alphabet.*.xml'):
         if conversionMode != None :
             output.attrib["conversionMode"] = conversionMode2str(conversionMode)
         
-        for comment in alphabet.findall("*"):
-            if "function Comment" in str(comment.tag): 
-                output.append(comment)
+        output.extend(comments)
         
         explicitInvisible = True
-        for group in alphabet.findall("group") :
-            parseRecursive(group, output, explicitInvisible)
+        groupNodes = []
+        for group in groups :
+            parseRecursive(group, groupNodes, explicitInvisible, state)
             explicitInvisible = False
+        output.extend(groupNodes)
         
         if(paragraph != None and space != None) :
             newGroup = ET.SubElement(output, "group", {
                 "name" : "paragraphSpace",
                 "colorInfoName" : "paragraphSpace"
             })
-            AddCharData(newGroup, paragraph)
-            AddCharData(newGroup, space)
+            newGroup.extend((AddCharData(paragraph, state), AddCharData(space, state)))
         elif (paragraph != None) :
             newGroup = ET.SubElement(output, "group", {
                 "name" : "paragraph",
                 "colorInfoName" : "saragraph"
             })
-            AddCharData(newGroup, paragraph)
+            newGroup.append(AddCharData(paragraph, state))
         elif (space != None) :
             newGroup = ET.SubElement(output, "group", {
                 "name" : "space",
                 "colorInfoName" : "space"
             })
-            AddCharData(newGroup, space)
+            newGroup.append(AddCharData(space, state))
         
             
-        tree = ET.ElementTree(output)
-        ET.indent(tree, space="\t", level=0)
         alphnamePath = cleanString(name.lower().replace(" ", ".").replace(",", "")).replace("..", ".")
         newFilename = f"./autoConverted/alphabet.{alphnamePath}.xml"
-        with open(newFilename, 'wb') as f:
-            f.write(b'<?xml version="1.0" encoding="UTF-8"?>\n')
-            f.write(b'<!DOCTYPE alphabet SYSTEM "../alphabet.dtd">\n')
-            tree.write(f, encoding="utf-8")
\ No newline at end of file
+        converted.append((newFilename, ALPHABET_HEADER + ET.tostring(output, pretty_print=True, encoding="UTF-8", xml_declaration=False)))
+
+        # drop the converted alphabet so only one is held in memory at a time
+        alphabet.clear()
+        while alphabet.getprevious() is not None :
+            del alphabet.getparent()[0]
+
+    return converted
+
+if __name__ == "__main__":
+    # every input file is converted in parallel, but the results are written here in input
+    # order: some files contain alphabets with the same name (e.g. Thai.xml and Thai2.xml),
+    # so concurrent writes from the workers would race on the same output file
+    with os.scandir('./oldAlphabets') as entries:
+        filenames = [e.path for e in entries if e.name.startswith('alphabet.') and e.name.endswith('.xml')]
+    with ProcessPoolExecutor() as executor:
+        for converted in executor.map(convertFile, filenames):
+            for newFilename, blob in converted:
+                with open(newFilename, 'wb') as f:
+                    f.write(blob)
@@ -0,0 +1,32 @@
+from lxml import etree as ET
+
+from ConvertAlphabet import convertFile
+
+def convert(tmp_path, groups):
+    oldAlphabets = tmp_path / "oldAlphabets"
+    oldAlphabets.mkdir()
+    filename = oldAlphabets / "alphabet.Test.xml"
+    filename.write_text(f'''<?xml version="1.0" encoding="UTF-8"?>
+<alphabets>
+<alphabet name="Test">
+<orientation type="LR"/>
+<train>training_test.txt</train>
+<group name="first"><s d="a" t="a"/></group>
+{groups}
+</alphabet>
+</alphabets>
+''', encoding="utf-8")
+    [(newFilename, blob)] = convertFile(str(filename))
+    assert newFilename == "./autoConverted/alphabet.test.xml"
+    return ET.fromstring(blob.split(b"\n", 2)[2])
+
+def test_invisible_wrapper_around_single_group_is_collapsed(tmp_path):
+    output = convert(tmp_path, '<group visible="no"><group name="inner"><s d="b" t="b"/><s d="c" t="c"/></group></group>')
+    assert len(output.findall(".//group")) == 2
+    assert [group.get("name") for group in output.findall("group")] == ["first", "inner"]
+    assert len(output.find("group[@name='inner']").findall("node")) == 2
+
+def test_named_wrapper_around_single_group_is_kept(tmp_path):
+    output = convert(tmp_path, '<group visible="no" name="outer"><group name="inner"><s d="b" t="b"/></group></group>')
+    assert len(output.findall(".//group")) == 3
+    assert output.find("group[@name='outer']/group").get("name") == "inner"